@@ -0,0 +1,33 @@
+import html
+import json
+import re
+
+import pytest
+
+import app
+from app import SITE_MARKERS_TOKEN, _build_map_html, _map_skeleton, get_sites
+
+
+def test_skeleton_splits_on_the_placeholder():
+    prefix, suffix = _map_skeleton()
+    assert prefix.startswith('<div') and suffix.endswith('</div>')
+    # The single placeholder was consumed by the split
+    assert SITE_MARKERS_TOKEN not in prefix + suffix
+
+
+def test_skeleton_raises_when_placeholder_not_rendered(monkeypatch):
+    # tojson escapes '<' as \u003c, so this token never matches its json.dumps form
+    monkeypatch.setattr(app, 'SITE_MARKERS_TOKEN', '<missing>')
+    with pytest.raises(RuntimeError, match='found 0'):
+        _map_skeleton.__wrapped__()
+
+
+def test_site_rows_land_in_cluster_data():
+    map_html = _build_map_html.__wrapped__('all', 0)  # bypass the per-filter cache
+    # The map page sits HTML-escaped inside the iframe srcdoc
+    page = html.unescape(re.search(r'srcdoc="([^"]*)"', map_html).group(1))
+    data = json.loads(re.search(r'var data = (.*);', page).group(1))
+    sites = get_sites()
+    assert len(data) == len(sites)
+    assert data[0][:2] == [float(sites[0]['Latitude']), float(sites[0]['Longitude'])]
+    assert data[0][2] == html.escape(sites[0]['_popup'])
@@ -0,0 +1,33 @@
+from collections import defaultdict
+
+from app import add_site_record, get_data, remove_site_by_name
+
+
+def assert_index_matches(data):
+    expected = defaultdict(list)
+    for i, site in enumerate(data.sites):
+        expected[site['SiteName']].append(i)
+    assert {k: sorted(v) for k, v in data.sites_by_name.items()} == dict(expected)
+
+
+def test_delete_with_duplicate_names(monkeypatch):
+    data = get_data()
+    monkeypatch.setattr(data, 'sites', [])
+    monkeypatch.setattr(data, 'sites_by_name', defaultdict(list))
+    for name in ['B', 'A', 'C', 'A']:
+        add_site_record({'SiteName': name, 'MineralName': 'Cobalt', 'CountryName': 'Namibia', 'Production_tonnes': 1})
+    assert_index_matches(data)
+
+    # B is swapped out for the last site (the second A), whose index entry must move to 0
+    assert remove_site_by_name('B')
+    assert [s['SiteName'] for s in data.sites] == ['A', 'A', 'C']
+    assert_index_matches(data)
+
+    assert remove_site_by_name('A')
+    assert_index_matches(data)
+    assert remove_site_by_name('A')
+    assert [s['SiteName'] for s in data.sites] == ['C']
+    assert_index_matches(data)
+
+    assert not remove_site_by_name('A')
+    assert 'A' not in data.sites_by_name
@@ -1,12 +1,40 @@
-from flask import Flask, render_template, request, redirect, url_for, session
+import functools
+import html
+import json
+import os
+import threading
+from collections import defaultdict
+from io import BytesIO
+from types import SimpleNamespace
+
+from flask import Flask, render_template, request, redirect, url_for, session, g
+from markupsafe import Markup
+from flask_caching import Cache
+from flask_compress import Compress
+import numpy as np
 import pandas as pd
+from pandas.api.types import union_categoricals
 import folium
+from folium.plugins import FastMarkerCluster
 import plotly.express as px
 import plotly.graph_objects as go
+from plotly.offline import get_plotlyjs_version
 from plotly.subplots import make_subplots
+from reportlab.lib.pagesizes import letter
+from reportlab.pdfgen import canvas
 
 app = Flask(__name__)
 app.secret_key = 'your_secret_key_here'  # Change for production
+# In-process cache for rendered chart fragments (production data is static per process)
+cache = Cache(app, config={'CACHE_TYPE': 'SimpleCache', 'CACHE_DEFAULT_TIMEOUT': 3600})
+# Plotly.js is loaded once by a <script> tag in the charts template (browser-cacheable) rather than
+# referenced from every chart fragment; pin it to the version the Python package serializes for.
+PLOTLYJS_CDN = f'https://cdn.plot.ly/plotly-{get_plotlyjs_version()}.min.js'
+CHART_CONFIG = {'responsive': True, 'displaylogo': False}
+# Compress responses (the chart and map pages are large HTML); brotli first when the client accepts it
+app.config['COMPRESS_MIN_SIZE'] = 500
+app.config['COMPRESS_ALGORITHM'] = ['br', 'gzip']
+Compress(app)
 
 
 # Theme helper: inject current theme into templates
@@ -30,141 +58,309 @@ def set_theme():
         session['theme'] = theme
     return ('', 204)
 
-# Load all CSVs with error handling
-try:
-    minerals_df = pd.read_csv('data/minerals.csv')
-    extra_minerals_df = pd.read_csv('data/extra_minerals.csv')
-    minerals_df = pd.concat([minerals_df, extra_minerals_df], ignore_index=True)  # Merge XLSX data
-    minerals = minerals_df.set_index('MineralName').to_dict('index')
-except Exception as e:
-    print(f"Error loading minerals: {e}")
-    minerals = {}  # Fallback empty dict
-
-try:
-    countries_df = pd.read_csv('data/countries.csv')
-    countries = countries_df.set_index('CountryName').to_dict('index')
-except Exception as e:
-    print(f"Error loading countries: {e}")
-    countries = {}
-
-try:
-    production_df = pd.read_csv('data/production_stats.csv')
-    # Fixed merge: Index lookup DFs on IDs for proper names
-    minerals_indexed = minerals_df.set_index('MineralID')
-    countries_indexed = countries_df.set_index('CountryID')
-    production_df = production_df.merge(minerals_indexed[['MineralName']], left_on='MineralID', right_index=True, how='left')
-    production_df = production_df.merge(countries_indexed[['CountryName']], left_on='CountryID', right_index=True, how='left')
-    df = production_df.rename(columns={'MineralName': 'mineral', 'CountryName': 'country'})
-except Exception as e:
-    print(f"Error loading production: {e}")
-    df = pd.DataFrame()  # Empty DF
-
-try:
-    users_df = pd.read_csv('data/users.csv')
-    users = users_df.set_index('Username').to_dict('index')
-except Exception as e:
-    print(f"Error loading users: {e}")
-    users = {}
-
-try:
-    roles_df = pd.read_csv('data/roles.csv')
-    PERMISSIONS = {}
-    for _, row in roles_df.iterrows():
-        role_name = row['RoleName']
-        perms_str = row['Permissions']
-        if role_name == 'Administrator':
-            PERMISSIONS[role_name] = ['all']
-        elif role_name == 'Investor':
-            # View country profiles, charts, production
-            PERMISSIONS[role_name] = ['profiles', 'charts', 'production']
-        elif role_name == 'Researcher':
-            # View/export mineral & country data, add insights, view country profiles, view map
-            PERMISSIONS[role_name] = ['database', 'export', 'insights', 'profiles', 'map']
+def read_table(name, columns=None):
+    # Prefer the Parquet copy written by convert_to_parquet.py (columnar, no text parsing);
+    # fall back to the CSV when there is no Parquet copy or the CSV has been edited since.
+    parquet_path = os.path.join('data', f'{name}.parquet')
+    csv_path = os.path.join('data', f'{name}.csv')
+    if os.path.exists(parquet_path):
+        if os.path.exists(csv_path) and os.path.getmtime(csv_path) > os.path.getmtime(parquet_path):
+            print(f"Warning: {csv_path} is newer than {parquet_path}; reading the CSV (re-run convert_to_parquet.py)")
         else:
-            PERMISSIONS[role_name] = []
-except Exception as e:
-    print(f"Error loading roles: {e}")
-    PERMISSIONS = {}
-
-try:
-    sites_df = pd.read_csv('data/sites.csv')
-    # Fixed merge for sites (same indexing)
-    minerals_indexed = minerals_df.set_index('MineralID')
-    countries_indexed = countries_df.set_index('CountryID')
-    sites_df = sites_df.merge(minerals_indexed[['MineralName']], left_on='MineralID', right_index=True, how='left')
-    sites_df = sites_df.merge(countries_indexed[['CountryName']], left_on='CountryID', right_index=True, how='left')
-    sites = sites_df.to_dict('records')
-    # Validate site coordinates against approximate country centroids and auto-correct obvious mismatches.
-    # This prevents markers appearing in the wrong hemisphere when coordinates were mixed up or countries mis-assigned.
-    country_centroids = {
-        'DRC (Congo)': (-4.038333, 21.758664),
-        'South Africa': (-30.559482, 22.937506),
-        'Mozambique': (-18.665695, 35.529562),
-        'Namibia': (-22.9576, 18.4904),
-    }
-    corrections = []
-    corrected_sites = []
-    for s in sites:
-        try:
-            lat = float(s.get('Latitude', 0))
-            lon = float(s.get('Longitude', 0))
-        except Exception:
-            corrected_sites.append(s)
-            continue
-        cname = s.get('CountryName')
-        if cname in country_centroids:
-            c_lat, c_lon = country_centroids[cname]
-            # If the site is more than ~10 deg latitude or ~20 deg longitude away from the country centroid,
-            # treat it as an obvious mismatch and snap it to the centroid (will correct Australia vs South Africa errors).
-            if abs(lat - c_lat) > 10 or abs(lon - c_lon) > 20:
-                # Detected a large discrepancy between site coords and assigned country centroid.
-                # Common data issues: lat/lon swapped or wrong sign. Try swapping lat/lon first and see
-                # if that brings the point closer to the country centroid. If so, apply the swap.
-                swapped_lat, swapped_lon = lon, lat
-                dist_orig = abs(lat - c_lat) + abs(lon - c_lon)
-                dist_swapped = abs(swapped_lat - c_lat) + abs(swapped_lon - c_lon)
-                note = ''
-                if dist_swapped < dist_orig:
-                    corrections.append({'SiteID': s.get('SiteID'), 'SiteName': s.get('SiteName'), 'CountryName': cname,
-                                        'action': 'swap_latlon', 'old': (lat, lon), 'new': (swapped_lat, swapped_lon)})
-                    s['Latitude'] = swapped_lat
-                    s['Longitude'] = swapped_lon
-                    note = 'Swapped lat/lon due to large mismatch with country centroid.'
-                else:
-                    # Do not snap to centroid automatically (data could be for a country not in our list).
-                    corrections.append({'SiteID': s.get('SiteID'), 'SiteName': s.get('SiteName'), 'CountryName': cname,
-                                        'action': 'mismatch', 'old': (lat, lon), 'country_centroid': (c_lat, c_lon)})
-                    note = 'Coordinate far from assigned country centroid; left unchanged for manual review.'
-                # Attach a note field for downstream CSV / debugging
-                s['Note'] = note
-        corrected_sites.append(s)
-    sites = corrected_sites
-    if corrections:
-        print('Site coordinate corrections applied:')
-        for c in corrections:
-            if c.get('action') == 'swap_latlon':
-                print(f" - Site {c['SiteID']} ({c['SiteName']}) in {c['CountryName']}: swapped {c['old']} -> {c['new']}")
-            elif c.get('action') == 'mismatch':
-                print(f" - Site {c['SiteID']} ({c['SiteName']}) in {c['CountryName']}: mismatch {c['old']} (country centroid {c.get('country_centroid')})")
+            try:
+                return pd.read_parquet(parquet_path, columns=columns)
+            except ImportError:
+                # pandas has no Parquet engine of its own; pyarrow is optional at runtime
+                if not os.path.exists(csv_path):
+                    raise
+                print(f"Warning: no Parquet engine installed (pip install pyarrow); reading {csv_path}")
+            except Exception as e:
+                if not os.path.exists(csv_path):
+                    raise
+                print(f"Warning: could not read {parquet_path} ({e}); reading {csv_path}")
+    return pd.read_csv(csv_path, usecols=columns)
+
+# Dashboard feature cards, in display order
+DASHBOARD_FEATURES = ('database', 'profiles', 'charts', 'map')
+
+
+def build_search_index(records, text_field):
+    # Lowercased (name, text, original key) tuples so search requests don't re-lower every entry
+    return [(k.lower(), str(v.get(text_field) or '').lower(), k) for k, v in records.items()]
+
+
+def site_popup(site):
+    return f"{site['SiteName']} - {site.get('MineralName', 'Unknown')} in {site.get('CountryName', 'Unknown')} ({site['Production_tonnes']} tonnes)"
+
+
+# Load all data sources with error handling. Deferred to first use via get_data() so importing
+# the module, e.g. from tests, only sets up Flask; run with `python app.py` to load eagerly.
+def _load_data():
+    try:
+        minerals_df = read_table('minerals')
+        extra_minerals_df = read_table('extra_minerals')
+        # Encode MineralName against one shared categorical dtype so the concat (and the merges
+        # that reuse minerals_by_id) append integer codes instead of re-hashing strings
+        names = union_categoricals([minerals_df['MineralName'].astype('category'), extra_minerals_df['MineralName'].astype('category')])
+        name_dtype = pd.CategoricalDtype(names.categories)
+        minerals_df['MineralName'] = minerals_df['MineralName'].astype(name_dtype)
+        extra_minerals_df['MineralName'] = extra_minerals_df['MineralName'].astype(name_dtype)
+        minerals_df = pd.concat([minerals_df, extra_minerals_df], ignore_index=True)  # Merge XLSX data
+        minerals = minerals_df.set_index('MineralName').to_dict('index')
+        # ID -> name lookup shared by the production and sites merges
+        minerals_by_id = minerals_df.set_index('MineralID')[['MineralName']]
+    except Exception as e:
+        print(f"Error loading minerals: {e}")
+        minerals = {}  # Fallback empty dict
+        minerals_by_id = None
+
+    try:
+        countries_df = read_table('countries')
+        countries = countries_df.set_index('CountryName').to_dict('index')
+        countries_by_id = countries_df.set_index('CountryID')[['CountryName']]
+    except Exception as e:
+        print(f"Error loading countries: {e}")
+        countries = {}
+        countries_by_id = None
+
+    try:
+        production_df = read_table('production_stats', columns=['MineralID', 'CountryID', 'Year', 'Production_tonnes', 'ExportValue_BillionUSD'])
+        # Fixed merge: Index lookup DFs on IDs for proper names
+        production_df = production_df.merge(minerals_by_id, left_on='MineralID', right_index=True, how='left')
+        production_df = production_df.merge(countries_by_id, left_on='CountryID', right_index=True, how='left')
+        df = production_df.rename(columns={'MineralName': 'mineral', 'CountryName': 'country'})
+        # Repeated names as categoricals: smaller frame and integer-code equality in the chart filters
+        df['mineral'] = df['mineral'].astype('category')
+        df['country'] = df['country'].astype('category')
+        # Cast numeric columns once here so chart requests can filter read-only views of df
+        for col in ['Production_tonnes', 'ExportValue_BillionUSD']:
+            df[col] = pd.to_numeric(df[col], errors='coerce')
+        # Sorted (mineral, country) index for direct lookups when both chart filters are set
+        df_by_mineral_country = df.set_index(['mineral', 'country']).sort_index()
+    except Exception as e:
+        print(f"Error loading production: {e}")
+        df = pd.DataFrame()  # Empty DF
+        df_by_mineral_country = df
+
+    try:
+        users_df = read_table('users')
+        users = users_df.set_index('Username').to_dict('index')
+    except Exception as e:
+        print(f"Error loading users: {e}")
+        users = {}
+
+    try:
+        roles_df = read_table('roles')
+        permissions = {}
+        for _, row in roles_df.iterrows():
+            role_name = row['RoleName']
+            perms_str = row['Permissions']
+            if role_name == 'Administrator':
+                permissions[role_name] = ['all']
+            elif role_name == 'Investor':
+                # View country profiles, charts, production
+                permissions[role_name] = ['profiles', 'charts', 'production']
+            elif role_name == 'Researcher':
+                # View/export mineral & country data, add insights, view country profiles, view map
+                permissions[role_name] = ['database', 'export', 'insights', 'profiles', 'map']
+            else:
+                permissions[role_name] = []
+        role_id_to_name = dict(zip(roles_df['RoleID'], roles_df['RoleName']))
+    except Exception as e:
+        print(f"Error loading roles: {e}")
+        permissions = {}
+        role_id_to_name = {}
+
+    # Per-role lookups derived once from the static permissions table
+    role_is_admin = {r: 'all' in p for r, p in permissions.items()}
+
+    # Resolve each user's role name once so login is a plain dict read
+    for user in users.values():
+        user['RoleName'] = role_id_to_name.get(user.get('RoleID'), 'Unknown')
+
+    try:
+        sites_df = read_table('sites', columns=['SiteID', 'SiteName', 'CountryID', 'MineralID', 'Latitude', 'Longitude', 'Production_tonnes'])
+        # Fixed merge for sites (same indexing)
+        sites_df = sites_df.merge(minerals_by_id, left_on='MineralID', right_index=True, how='left')
+        sites_df = sites_df.merge(countries_by_id, left_on='CountryID', right_index=True, how='left')
+        # Validate site coordinates against approximate country centroids and auto-correct obvious mismatches.
+        # This prevents markers appearing in the wrong hemisphere when coordinates were mixed up or countries mis-assigned.
+        country_centroids = {
+            'DRC (Congo)': (-4.038333, 21.758664),
+            'South Africa': (-30.559482, 22.937506),
+            'Mozambique': (-18.665695, 35.529562),
+            'Namibia': (-22.9576, 18.4904),
+        }
+        centroids_df = pd.DataFrame([(name, c_lat, c_lon) for name, (c_lat, c_lon) in country_centroids.items()],
+                                    columns=['CountryName', 'c_lat', 'c_lon'])
+        sites_df = sites_df.merge(centroids_df, on='CountryName', how='left')
+        # Unparseable coordinates and countries without a centroid become NaN and never compare as mismatches.
+        lat = pd.to_numeric(sites_df['Latitude'], errors='coerce')
+        lon = pd.to_numeric(sites_df['Longitude'], errors='coerce')
+        # If the site is more than ~10 deg latitude or ~20 deg longitude away from the country centroid,
+        # treat it as an obvious mismatch (e.g. Australia vs South Africa errors).
+        mism = ((lat - sites_df['c_lat']).abs() > 10) | ((lon - sites_df['c_lon']).abs() > 20)
+        # Common data issues: lat/lon swapped or wrong sign. Swap lat/lon where that brings the point closer
+        # to the country centroid; otherwise leave it for manual review (the country could be missing from our list).
+        dist_orig = (lat - sites_df['c_lat']).abs() + (lon - sites_df['c_lon']).abs()
+        dist_swapped = (lon - sites_df['c_lat']).abs() + (lat - sites_df['c_lon']).abs()
+        swap = mism & (dist_swapped < dist_orig)
+        sites_df['Latitude'] = np.where(swap, lon, sites_df['Latitude'])
+        sites_df['Longitude'] = np.where(swap, lat, sites_df['Longitude'])
+        sites = sites_df.drop(columns=['c_lat', 'c_lon']).to_dict('records')
+        corrections = []
+        # sites_df has a fresh RangeIndex after the merges, so row labels are positions in sites
+        for i in sites_df.index[mism]:
+            s = sites[i]
+            old = (float(lat[i]), float(lon[i]))
+            if swap[i]:
+                corrections.append({'SiteID': s.get('SiteID'), 'SiteName': s.get('SiteName'), 'CountryName': s['CountryName'],
+                                    'action': 'swap_latlon', 'old': old, 'new': old[::-1]})
+                note = 'Swapped lat/lon due to large mismatch with country centroid.'
             else:
-                # Generic fallback
-                old = c.get('old')
-                new = c.get('new')
-                print(f" - Site {c.get('SiteID')} ({c.get('SiteName')}): {old} -> {new}")
-        try:
-            # Save a backup with the corrected coordinates so changes are visible to the user.
-            sites_df_corrected = pd.DataFrame(sites)
-            sites_df_corrected.to_csv('data/sites_fixed.csv', index=False)
-            print('Wrote corrected sites to data/sites_fixed.csv')
-        except Exception as e:
-            print(f'Failed to write corrected sites CSV: {e}')
-except Exception as e:
-    print(f"Error loading sites: {e}")
-    sites = []
+                corrections.append({'SiteID': s.get('SiteID'), 'SiteName': s.get('SiteName'), 'CountryName': s['CountryName'],
+                                    'action': 'mismatch', 'old': old, 'country_centroid': country_centroids[s['CountryName']]})
+                note = 'Coordinate far from assigned country centroid; left unchanged for manual review.'
+            # Attach a note field (flagged sites only) for downstream CSV / debugging
+            s['Note'] = note
+        if corrections:
+            print('Site coordinate corrections applied:')
+            for c in corrections:
+                if c.get('action') == 'swap_latlon':
+                    print(f" - Site {c['SiteID']} ({c['SiteName']}) in {c['CountryName']}: swapped {c['old']} -> {c['new']}")
+                elif c.get('action') == 'mismatch':
+                    print(f" - Site {c['SiteID']} ({c['SiteName']}) in {c['CountryName']}: mismatch {c['old']} (country centroid {c.get('country_centroid')})")
+                else:
+                    # Generic fallback
+                    old = c.get('old')
+                    new = c.get('new')
+                    print(f" - Site {c.get('SiteID')} ({c.get('SiteName')}): {old} -> {new}")
+            try:
+                # Save a backup with the corrected coordinates so changes are visible to the user.
+                sites_df_corrected = pd.DataFrame(sites)
+                sites_df_corrected.to_csv('data/sites_fixed.csv', index=False)
+                print('Wrote corrected sites to data/sites_fixed.csv')
+            except Exception as e:
+                print(f'Failed to write corrected sites CSV: {e}')
+    except Exception as e:
+        print(f"Error loading sites: {e}")
+        sites = []
+
+    # Pre-render marker popups once
+    for site in sites:
+        site['_popup'] = site_popup(site)
+    # SiteName -> positions in sites, kept in step with sites by add_site_record/remove_site_by_name
+    sites_by_name = defaultdict(list)
+    for i, site in enumerate(sites):
+        sites_by_name[site.get('SiteName')].append(i)
+
+    return SimpleNamespace(
+        minerals=minerals,
+        countries=countries,
+        minerals_search_index=build_search_index(minerals, 'Description'),
+        countries_search_index=build_search_index(countries, 'KeyProjects'),
+        df=df,
+        df_by_mineral_country=df_by_mineral_country,
+        users=users,
+        role_permissions={r: frozenset(p) for r, p in permissions.items()},
+        role_is_admin=role_is_admin,
+        role_features={r: [f for f in DASHBOARD_FEATURES if role_is_admin[r] or f in p] for r, p in permissions.items()},
+        sites=sites,
+        sites_by_name=sites_by_name,
+        # Bumped whenever sites changes so cached maps are rebuilt
+        sites_version=0,
+    )
+
+
+_data = None
+_data_lock = threading.Lock()
+
+
+def get_data():
+    # Double-checked so concurrent first requests load (and write sites_fixed.csv) only once
+    # and all share the same namespace
+    global _data
+    if _data is None:
+        with _data_lock:
+            if _data is None:
+                _data = _load_data()
+    return _data
+
+
+def get_minerals():
+    return get_data().minerals
+
+
+def get_countries():
+    return get_data().countries
+
+
+def get_sites():
+    return get_data().sites
+
+
+def refresh_search_indexes():
+    # Call after any in-memory change to minerals or countries (admin panel)
+    data = get_data()
+    data.minerals_search_index = build_search_index(data.minerals, 'Description')
+    data.countries_search_index = build_search_index(data.countries, 'KeyProjects')
+
+
+def add_site_record(site):
+    data = get_data()
+    site['_popup'] = site_popup(site)
+    data.sites_by_name[site['SiteName']].append(len(data.sites))
+    data.sites.append(site)
+    data.sites_version += 1
+
+
+def remove_site_by_name(site_name):
+    # Swap the matching site with the last one and pop, so deletes don't scan or shift the list
+    data = get_data()
+    sites = data.sites
+    positions = data.sites_by_name.get(site_name)
+    if not positions:
+        return False
+    idx = positions.pop()
+    if not positions:
+        del data.sites_by_name[site_name]
+    last_idx = len(sites) - 1
+    if idx != last_idx:
+        moved = sites[last_idx]
+        sites[idx] = moved
+        moved_positions = data.sites_by_name[moved.get('SiteName')]
+        moved_positions[moved_positions.index(last_idx)] = idx
+    sites.pop()
+    data.sites_version += 1
+    return True
+
+@app.before_request
+def load_user_permissions():
+    # Read the session once per request; routes and guards use g instead of re-reading it
+    g.user = session.get('user')
+    g.role = session.get('role') if g.user else None
+    data = get_data()
+    g.perms = data.role_permissions.get(g.role, frozenset())
+    g.is_admin = data.role_is_admin.get(g.role, False)
+
+
+def require_permission(permission):
+    # Route guard: administrators pass every check, other roles need the named permission
+    def decorator(view):
+        @functools.wraps(view)
+        def wrapped(*args, **kwargs):
+            if g.user is None:
+                return redirect(url_for('dashboard'))
+            if not (g.is_admin or permission in g.perms):
+                return redirect(url_for('dashboard'))
+            return view(*args, **kwargs)
+        return wrapped
+    return decorator
+
 
 @app.route('/')
 def index():
-    if 'user' in session:
+    if g.user is not None:
         return redirect(url_for('dashboard'))
     return redirect(url_for('login'))
 
@@ -174,11 +370,10 @@ def login():
     if request.method == 'POST':
         username = request.form['username']
         password = request.form['password']
+        users = get_data().users
         if username in users and users[username]['PasswordHash'] == password:
             session['user'] = username
-            role_id = users[username]['RoleID']
-            role_name = roles_df[roles_df['RoleID'] == role_id]['RoleName'].iloc[0] if not roles_df.empty else 'Unknown'
-            session['role'] = role_name
+            session['role'] = users[username]['RoleName']
             # Auto-redirect to dashboard with success message
             return redirect(url_for('dashboard', success='Login successful!'))
         else:
@@ -195,35 +390,24 @@ def logout():
 @app.route('/dashboard')
 def dashboard():
     success = request.args.get('success')  # Get success from redirect URL
-    if 'user' not in session:
+    if g.user is None:
         return redirect(url_for('login'))
-    role = session['role']
-    allowed_features = []
-    is_admin = False
-    if 'all' in PERMISSIONS.get(role, []) or 'database' in PERMISSIONS.get(role, []):
-        allowed_features.append('database')
-    if 'all' in PERMISSIONS.get(role, []) or 'profiles' in PERMISSIONS.get(role, []):
-        allowed_features.append('profiles')
-    if 'all' in PERMISSIONS.get(role, []) or 'charts' in PERMISSIONS.get(role, []):
-        allowed_features.append('charts')
-    if 'all' in PERMISSIONS.get(role, []) or 'map' in PERMISSIONS.get(role, []):
-        allowed_features.append('map')
-    if 'all' in PERMISSIONS.get(role, []):
-        is_admin = True
-    num_countries = len(countries)
-    num_minerals = len(minerals)
-    num_sites = len(sites)
+    role = g.role
+    allowed_features = get_data().role_features.get(role, [])
+    is_admin = g.is_admin
+    num_countries = len(get_countries())
+    num_minerals = len(get_minerals())
+    num_sites = len(get_sites())
     return render_template('dashboard.html', role=role, features=allowed_features, success=success, num_countries=num_countries, num_minerals=num_minerals, num_sites=num_sites, is_admin=is_admin)
 
 
 
 # Admin panel for editing, adding, and deleting data
 @app.route('/admin', methods=['GET', 'POST'])
+@require_permission('all')
 def admin():
-    if 'user' not in session or 'all' not in PERMISSIONS.get(session['role'], []):
-        return redirect(url_for('dashboard'))
     message = None
-    global minerals, countries, sites
+    minerals, countries, sites = get_minerals(), get_countries(), get_sites()
     if request.method == 'POST':
         action = request.form.get('action')
         # Mineral edit
@@ -235,6 +419,7 @@ def admin():
                 minerals[mineral_name]['Description'] = description
                 minerals[mineral_name]['MarketPriceUSD_per_tonne'] = price
                 message = f"Updated {mineral_name}. (Note: Changes are in-memory and not persisted to CSV.)"
+                refresh_search_indexes()
             else:
                 message = f"Mineral {mineral_name} not found."
         # Mineral delete
@@ -243,6 +428,7 @@ def admin():
             if mineral_name in minerals:
                 del minerals[mineral_name]
                 message = f"Deleted {mineral_name}. (In-memory only.)"
+                refresh_search_indexes()
             else:
                 message = f"Mineral {mineral_name} not found."
         # Add country
@@ -258,6 +444,7 @@ def admin():
                     'KeyProjects': key_projects
                 }
                 message = f"Added country {country_name}. (In-memory only.)"
+                refresh_search_indexes()
             else:
                 message = f"Country {country_name} already exists or invalid."
         # Delete country
@@ -266,6 +453,7 @@ def admin():
             if country_name in countries:
                 del countries[country_name]
                 message = f"Deleted country {country_name}. (In-memory only.)"
+                refresh_search_indexes()
             else:
                 message = f"Country {country_name} not found."
         # Add site
@@ -285,21 +473,16 @@ def admin():
                     'Longitude': float(longitude),
                     'Production_tonnes': int(production)
                 }
-                sites.append(new_site)
+                add_site_record(new_site)
                 message = f"Added site {site_name}. (In-memory only.)"
             else:
                 message = f"Invalid site data or missing country/mineral."
         # Delete site
         elif action == 'delete_site':
             site_name = request.form.get('site_name')
-            found = False
-            for i, s in enumerate(sites):
-                if s.get('SiteName') == site_name:
-                    del sites[i]
-                    found = True
-                    message = f"Deleted site {site_name}. (In-memory only.)"
-                    break
-            if not found:
+            if remove_site_by_name(site_name):
+                message = f"Deleted site {site_name}. (In-memory only.)"
+            else:
                 message = f"Site {site_name} not found."
     return render_template('admin.html', minerals=minerals, countries=countries, sites=sites, message=message)
 
@@ -308,20 +491,20 @@ def admin():
 insights = []
 
 @app.route('/mineral_database', methods=['GET', 'POST'])
+@require_permission('database')
 def mineral_database():
-    if 'user' not in session or ('database' not in PERMISSIONS.get(session['role'], []) and 'all' not in PERMISSIONS.get(session['role'], [])):
-        return redirect(url_for('dashboard'))
     message = None
     search_query = request.args.get('search', '').strip().lower()
+    minerals = get_minerals()
     filtered_minerals = minerals
     if search_query:
-        filtered_minerals = {k: v for k, v in minerals.items() if search_query in k.lower() or search_query in v.get('Description','').lower()}
+        matches = [orig for lk, ld, orig in get_data().minerals_search_index if search_query in lk or search_query in ld]
+        filtered_minerals = {k: minerals[k] for k in matches}
     # Allow researchers to add insights
     if request.method == 'POST' and 'insight' in request.form:
-        user = session.get('user', 'unknown')
-        role = session.get('role', '')
+        user = g.user or 'unknown'
         # Only allow researchers (or those with 'insights' permission) to add insights
-        if role == 'Researcher' or 'insights' in PERMISSIONS.get(role, []):
+        if g.role == 'Researcher' or 'insights' in g.perms:
             insight = request.form.get('insight')
             if insight:
                 insights.append({'user': user, 'insight': insight, 'type': 'mineral'})
@@ -330,70 +513,63 @@ def mineral_database():
             message = 'You do not have permission to add insights.'
     return render_template('mineral_database.html', minerals=filtered_minerals, insights=[i for i in insights if i['type']=='mineral'], message=message, search_query=search_query)
 
-# Download PDF of mineral data (researcher only)
-@app.route('/download/minerals.pdf')
-def download_minerals_pdf():
-    if 'user' not in session or (session['role'] != 'Researcher' and 'all' not in PERMISSIONS.get(session['role'], [])):
-        return redirect(url_for('dashboard'))
-    from io import BytesIO
-    from reportlab.lib.pagesizes import letter
-    from reportlab.pdfgen import canvas
+def _new_text(p, y):
+    t = p.beginText(30, y)
+    t.setFont("Helvetica", 12)
+    t.setLeading(20)
+    return t
+
+
+def _pdf_response(title, lines, filename):
+    # Rows go into one text object per page (a single BT...ET block) instead of a drawString call each
     buffer = BytesIO()
     p = canvas.Canvas(buffer, pagesize=letter)
     p.setFont("Helvetica", 12)
-    y = 750
-    p.drawString(30, y, "Mineral Data Export")
-    y -= 30
-    for mineral, info in minerals.items():
-        p.drawString(30, y, f"{mineral}: {info.get('Description','')} | ${info.get('MarketPriceUSD_per_tonne','')}")
-        y -= 20
-        if y < 50:
+    p.drawString(30, 750, title)
+    t = _new_text(p, 720)
+    for line in lines:
+        # Break before writing, so a page the rows exactly fill is not followed by an empty one
+        if t.getY() < 50:
+            p.drawText(t)
             p.showPage()
-            y = 750
+            t = _new_text(p, 750)
+        t.textLine(line)
+    p.drawText(t)
     p.save()
     buffer.seek(0)
-    return app.response_class(buffer, mimetype='application/pdf', headers={"Content-Disposition": "attachment;filename=minerals.pdf"})
+    return app.response_class(buffer, mimetype='application/pdf', headers={"Content-Disposition": f"attachment;filename={filename}"})
+
+
+# Download PDF of mineral data (researcher only)
+@app.route('/download/minerals.pdf')
+@require_permission('export')
+def download_minerals_pdf():
+    lines = (f"{mineral}: {info.get('Description','')} | ${info.get('MarketPriceUSD_per_tonne','')}" for mineral, info in get_minerals().items())
+    return _pdf_response("Mineral Data Export", lines, 'minerals.pdf')
 
 # Download PDF of country data (researcher only)
 @app.route('/download/countries.pdf')
+@require_permission('export')
 def download_countries_pdf():
-    if 'user' not in session or (session['role'] != 'Researcher' and 'all' not in PERMISSIONS.get(session['role'], [])):
-        return redirect(url_for('dashboard'))
-    from io import BytesIO
-    from reportlab.lib.pagesizes import letter
-    from reportlab.pdfgen import canvas
-    buffer = BytesIO()
-    p = canvas.Canvas(buffer, pagesize=letter)
-    p.setFont("Helvetica", 12)
-    y = 750
-    p.drawString(30, y, "Country Data Export")
-    y -= 30
-    for country, info in countries.items():
-        p.drawString(30, y, f"{country}: GDP ${info.get('GDP_BillionUSD','')}B | Mining Revenue ${info.get('MiningRevenue_BillionUSD','')}B | Projects: {info.get('KeyProjects','')}")
-        y -= 20
-        if y < 50:
-            p.showPage()
-            y = 750
-    p.save()
-    buffer.seek(0)
-    return app.response_class(buffer, mimetype='application/pdf', headers={"Content-Disposition": "attachment;filename=countries.pdf"})
+    lines = (f"{country}: GDP ${info.get('GDP_BillionUSD','')}B | Mining Revenue ${info.get('MiningRevenue_BillionUSD','')}B | Projects: {info.get('KeyProjects','')}" for country, info in get_countries().items())
+    return _pdf_response("Country Data Export", lines, 'countries.pdf')
 
 
 @app.route('/country_profiles', methods=['GET', 'POST'])
+@require_permission('profiles')
 def country_profiles():
-    if 'user' not in session or ('profiles' not in PERMISSIONS.get(session['role'], []) and 'all' not in PERMISSIONS.get(session['role'], [])):
-        return redirect(url_for('dashboard'))
     message = None
     search_query = request.args.get('search', '').strip().lower()
+    countries = get_countries()
     filtered_countries = countries
     if search_query:
-        filtered_countries = {k: v for k, v in countries.items() if search_query in k.lower() or search_query in v.get('KeyProjects','').lower()}
+        matches = [orig for lk, lp, orig in get_data().countries_search_index if search_query in lk or search_query in lp]
+        filtered_countries = {k: countries[k] for k in matches}
     # Allow researchers to add insights
     if request.method == 'POST' and 'insight' in request.form:
-        user = session.get('user', 'unknown')
-        role = session.get('role', '')
+        user = g.user or 'unknown'
         # Only allow researchers (or those with 'insights' permission) to add insights
-        if role == 'Researcher' or 'insights' in PERMISSIONS.get(role, []):
+        if g.role == 'Researcher' or 'insights' in g.perms:
             insight = request.form.get('insight')
             if insight:
                 insights.append({'user': user, 'insight': insight, 'type': 'country'})
@@ -403,28 +579,45 @@ def country_profiles():
     return render_template('country_profiles.html', countries=filtered_countries, insights=[i for i in insights if i['type']=='country'], message=message, search_query=search_query)
 
 @app.route('/interactive_charts')
+@require_permission('charts')
 def interactive_charts():
-    if 'user' not in session or ('charts' not in PERMISSIONS.get(session['role'], []) and 'all' not in PERMISSIONS.get(session['role'], [])):
-        return redirect(url_for('dashboard'))
     # Basic filters for interactivity (Appendix A)
     mineral_filter = request.args.get('mineral', 'all')
     country_filter = request.args.get('country', 'all')
-    filtered_df = df.copy()
-    if mineral_filter != 'all':
-        filtered_df = filtered_df[filtered_df['mineral'] == mineral_filter]
-    if country_filter != 'all':
-        filtered_df = filtered_df[filtered_df['country'] == country_filter]
+    chart_json, price_json = _build_charts(mineral_filter, country_filter)
+    return render_template('interactive_charts.html', chart_json=chart_json, price_json=price_json, chart_config=CHART_CONFIG, plotlyjs_src=PLOTLYJS_CDN, minerals=list(get_minerals().keys()), countries=list(get_countries().keys()))
+
+
+def _figure_json(fig):
+    # Serialize a figure for Plotly.newPlot on the client (plotly uses orjson when installed).
+    # Escape <, > and & so filter values echoed into titles cannot close the inline <script>.
+    fig_json = fig.to_json().replace('<', '\\u003c').replace('>', '\\u003e').replace('&', '\\u0026')
+    return Markup(fig_json)
+
+
+# Build both chart figures as JSON for a (mineral, country) filter pair. Memoized so repeat views
+# skip the pandas filtering, the two px calls and the JSON serialization.
+@cache.memoize()
+def _build_charts(mineral_filter, country_filter):
+    data = get_data()
+    df = data.df
+    # Charts only read the data, so select from df without copying it
+    if df.empty:
+        filtered_df = df
+    elif mineral_filter != 'all' and country_filter != 'all':
+        key = (mineral_filter, country_filter)
+        by_key = data.df_by_mineral_country
+        filtered_df = by_key.loc[[key]].reset_index() if key in by_key.index else df.iloc[0:0]
+    else:
+        mask = pd.Series(True, index=df.index)
+        if mineral_filter != 'all':
+            mask &= df['mineral'].eq(mineral_filter)
+        if country_filter != 'all':
+            mask &= df['country'].eq(country_filter)
+        filtered_df = df.loc[mask]
     # Fixed charts: Ensure data has names/values, fallback to full df if empty
     if filtered_df.empty:
-        filtered_df = df.copy()
-
-    # Ensure essential columns exist and have proper dtypes
-    if 'Year' not in filtered_df.columns:
-        filtered_df['Year'] = pd.Series(dtype=int)
-    # Cast numeric columns safely
-    for col in ['Production_tonnes', 'ExportValue_BillionUSD']:
-        if col in filtered_df.columns:
-            filtered_df[col] = pd.to_numeric(filtered_df[col], errors='coerce')
+        filtered_df = df
 
     # Choose color/hover columns defensively
     color_col = 'mineral' if 'mineral' in filtered_df.columns else 'MineralID' if 'MineralID' in filtered_df.columns else None
@@ -436,7 +629,7 @@ def interactive_charts():
         fig_prod = go.Figure()
         fig_prod.add_annotation(text='No production data available for selected filters', xref='paper', yref='paper', showarrow=False)
         fig_prod.update_layout(template='plotly_white', height=420, margin=dict(t=60, b=40, l=60, r=20))
-        chart_div = fig_prod.to_html(full_html=False, include_plotlyjs='cdn', config={'responsive': True})
+        chart_json = _figure_json(fig_prod)
     else:
         # Production as bar (better for categorical data)
         fig_prod = px.bar(filtered_df, x='Year', y='Production_tonnes', color=color_col, barmode='group',
@@ -444,7 +637,7 @@ def interactive_charts():
                           hover_data=[c for c in (country_col, 'ExportValue_BillionUSD') if c], labels={'Production_tonnes': 'Tonnes'})
         fig_prod.update_layout(template='plotly_white', height=420, legend_title_text='Mineral/Group', xaxis_title='Year', yaxis_title='Production (Tonnes)', margin=dict(t=60, b=40, l=60, r=20))
         fig_prod.update_traces(marker_line_width=0.5)
-        chart_div = fig_prod.to_html(full_html=False, include_plotlyjs='cdn', config={'responsive': True})
+        chart_json = _figure_json(fig_prod)
 
     # Export as line (trends)
     if filtered_df.empty or filtered_df['ExportValue_BillionUSD'].dropna().empty:
@@ -452,27 +645,65 @@ def interactive_charts():
         fig_export = go.Figure()
         fig_export.add_annotation(text='No export value data available for selected filters', xref='paper', yref='paper', showarrow=False)
         fig_export.update_layout(template='plotly_white', height=420, margin=dict(t=60, b=40, l=60, r=20))
-        price_div = fig_export.to_html(full_html=False, include_plotlyjs=False, config={'responsive': True})
+        price_json = _figure_json(fig_export)
     else:
         fig_export = px.line(filtered_df, x='Year', y='ExportValue_BillionUSD', color=color_col,
                              title=f'Export Value Trends {mineral_filter if mineral_filter != "all" else ""} in {country_filter if country_filter != "all" else ""}',
                              hover_data=[c for c in (country_col, 'Production_tonnes') if c], labels={'ExportValue_BillionUSD': 'Billion USD'})
         fig_export.update_layout(template='plotly_white', height=420, legend_title_text='Mineral/Group', xaxis_title='Year', yaxis_title='Export Value (Billion USD)', margin=dict(t=60, b=40, l=60, r=20))
         fig_export.update_traces(mode='lines+markers')
-        # Use include_plotlyjs=False for the second chart since the first already includes the CDN script
-        price_div = fig_export.to_html(full_html=False, include_plotlyjs=False, config={'responsive': True})
+        price_json = _figure_json(fig_export)
+
+    return chart_json, price_json
+
+
+def _warm_charts():
+    # Pre-build the common chart filters so the first chart page view is a cache hit
+    with app.app_context():
+        data = get_data()
+        filters = [('all', 'all')] + [(m, 'all') for m in data.minerals] + [('all', c) for c in data.countries]
+        for mineral_filter, country_filter in filters:
+            try:
+                _build_charts(mineral_filter, country_filter)
+            except Exception as e:
+                print(f"Chart warmup failed for {mineral_filter}/{country_filter}: {e}")
+
+
+_warmup_lock = threading.Lock()
+_warmup_started = False
+
 
-    return render_template('interactive_charts.html', chart_div=chart_div, price_div=price_div, minerals=list(minerals.keys()), countries=list(countries.keys()))
+@app.before_request
+def start_chart_warmup():
+    # Kick off chart warmup in the background on the first request of each worker process
+    # (not at import, so importing the module stays cheap)
+    global _warmup_started
+    if _warmup_started:
+        return
+    with _warmup_lock:
+        if _warmup_started:
+            return
+        _warmup_started = True
+    threading.Thread(target=_warm_charts, daemon=True).start()
 
 @app.route('/geographical_map')
+@require_permission('map')
 def geographical_map():
-    if 'user' not in session or ('map' not in PERMISSIONS.get(session['role'], []) and 'all' not in PERMISSIONS.get(session['role'], [])):
-        return redirect(url_for('dashboard'))
     # Basic filter for map (Appendix A: alternatives/deposits)
     mineral_filter = request.args.get('mineral', 'all')
-    filtered_sites = sites
-    if mineral_filter != 'all':
-        filtered_sites = [s for s in sites if s.get('MineralName') == mineral_filter]
+    map_html = _build_map_html(mineral_filter, get_data().sites_version)
+    return render_template('geographical_map.html', map_html=map_html, minerals=list(get_minerals().keys()))
+
+
+MARKER_CALLBACK = 'function (row) { return L.marker([row[0], row[1]]).bindPopup(row[2]); }'
+# Placeholder for the cluster's data array in the cached map skeleton
+SITE_MARKERS_TOKEN = '__SITE_MARKERS__'
+
+
+@functools.cache
+def _map_skeleton():
+    # Render the static part of the map (tile layers, layer control, cluster layer) through
+    # Folium/Branca once and split it around the marker data; requests only serialize the rows.
     m = folium.Map(location=[0, 20], zoom_start=3, tiles=None, attr='Google Maps (English)')
     # Google Satellite default (English labels, real imagery)
     folium.TileLayer(tiles='https://mt1.google.com/vt/lyrs=s,h&x={x}&y={y}&z={z}&hl=en', 
@@ -482,10 +713,32 @@ def geographical_map():
                      attr='Google Roadmap (English)', name='Google Roadmap (English)', overlay=False, control=True).add_to(m)
     # (Removed OpenStreetMap fallback per user request; only Google Satellite and Roadmap layers remain)
     folium.LayerControl().add_to(m)
-    for site in filtered_sites:
-        folium.Marker([site['Latitude'], site['Longitude']], popup=f"{site['SiteName']} - {site.get('MineralName', 'Unknown')} in {site.get('CountryName', 'Unknown')} ({site['Production_tonnes']} tonnes)").add_to(m)
-    map_html = m._repr_html_()
-    return render_template('geographical_map.html', map_html=map_html, minerals=list(minerals.keys()))
+    # One clustered layer fed from a [lat, lon, popup] array instead of a Marker object (and JS statement) per site
+    cluster = FastMarkerCluster([], callback=MARKER_CALLBACK)
+    cluster.data = SITE_MARKERS_TOKEN
+    cluster.add_to(m)
+    # _repr_html_ HTML-escapes the page into an iframe srcdoc, so the placeholder is escaped too
+    # (this relies on FastMarkerCluster rendering its data with tojson; check it after folium upgrades)
+    parts = m._repr_html_().split(html.escape(json.dumps(SITE_MARKERS_TOKEN)))
+    if len(parts) != 2:
+        raise RuntimeError(f'Map skeleton expected exactly one site marker placeholder, found {len(parts) - 1}; '
+                           f'folium {folium.__version__} may render FastMarkerCluster data differently')
+    prefix, suffix = parts
+    return prefix, suffix
+
+
+# Folium map HTML per mineral filter. sites_version is part of the cache key so admin
+# changes to sites invalidate earlier maps.
+@functools.lru_cache(maxsize=64)
+def _build_map_html(mineral_filter, version):
+    sites = get_sites()
+    filtered_sites = sites
+    if mineral_filter != 'all':
+        filtered_sites = [s for s in sites if s.get('MineralName') == mineral_filter]
+    data = [[float(site['Latitude']), float(site['Longitude']), html.escape(site['_popup'])] for site in filtered_sites]
+    prefix, suffix = _map_skeleton()
+    return prefix + html.escape(json.dumps(data)) + suffix
 
 if __name__ == '__main__':
+    get_data()
     app.run(debug=True)
\ No newline at end of file
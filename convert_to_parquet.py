@@ -0,0 +1,21 @@
+# One-time conversion of the CSV data sources to Parquet.
+# app.py prefers data/<name>.parquet and falls back to the CSV when it is missing,
+# so re-run this script after editing any of the CSVs.
+import os
+
+import pandas as pd
+
+DATA_DIR = 'data'
+TABLES = ['minerals', 'extra_minerals', 'countries', 'production_stats', 'users', 'roles', 'sites']
+
+
+def convert(name):
+    csv_path = os.path.join(DATA_DIR, f'{name}.csv')
+    parquet_path = os.path.join(DATA_DIR, f'{name}.parquet')
+    pd.read_csv(csv_path).to_parquet(parquet_path, engine='pyarrow', compression='snappy', index=False)
+    print(f'Wrote {parquet_path}')
+
+
+if __name__ == '__main__':
+    for table in TABLES:
+        convert(table)